@@ -0,0 +1,180 @@
+'''
+Offscreen click-to-paint latency benchmark for the GUI
+
+Replays click sequences against the interactive SquareWidgets of a GameGUI
+running on Qt's offscreen platform and reports p50/p95/p99 latency for
+updateBoards, broken down into Board.update, Solver.update, the widget
+updates and the paint that follows.
+
+Click recordings are JSON, a single recording or a list of them:
+{"board_size": n, "n_stars": 1, "clicks": [[r, c, "left"], ...]}
+with optional "board_segments" for the layout (striped by default).
+'''
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import Qt
+from PyQt5.QtTest import QTest
+from board import Board
+from solver import Solver, IncrementalSolver
+from gui import GameGUI
+
+BUTTONS = {'left': Qt.LeftButton, 'right': Qt.RightButton}
+
+
+def striped_layout(n: int):
+    """
+    Simple n segment layout of wrapped diagonal stripes for any board size
+    """
+    return [[(r + c) % n for c in range(n)] for r in range(n)]
+
+
+def make_board(n: int, n_stars: int, layout=None) -> Board:
+    board = Board()
+    board.n_stars = n_stars
+    board.board_size = n
+    board.board_state = [[0] * n for _ in range(n)]
+    board.board_segments = layout if layout is not None else striped_layout(n)
+    return board
+
+
+def random_clicks(n: int, n_clicks: int, seed: int = 0):
+    """
+    Random click sequence, mostly left clicks (stars) with some right clicks (Xs)
+    """
+    rng = random.Random(seed)
+    clicks = []
+    for _ in range(n_clicks):
+        button = 'left' if rng.random() < 0.7 else 'right'
+        clicks.append([rng.randrange(n), rng.randrange(n), button])
+    return clicks
+
+
+def percentile(samples, p: float) -> float:
+    """
+    Nearest-rank percentile of a list of samples
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    i = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+    return ordered[i]
+
+
+class Timed():
+    """
+    Wrap a bound method and record the duration of each call
+    """
+    def __init__(self, fn) -> None:
+        self.fn = fn
+        self.samples = []
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        result = self.fn(*args, **kwargs)
+        self.samples.append(time.perf_counter() - start)
+        return result
+
+
+def run(app: QApplication, board: Board, clicks, incremental: bool = False):
+    """
+    Replay clicks on a fresh GameGUI, returns {stage: [seconds per click]}
+    """
+    solver = IncrementalSolver(board) if incremental else Solver(board)
+    gui = GameGUI(board, solver)
+    gui.win = lambda: None
+    gui.run()
+    app.processEvents()
+
+    # Instance attributes shadow the methods, so updateBoards calls the timed versions
+    timers = {
+        'board': Timed(board.update),
+        'solver': Timed(solver.update),
+        'game_widget': Timed(gui.game_widget.update),
+        'solver_widget': Timed(gui.solver_widget.update),
+    }
+    board.update = timers['board']
+    solver.update = timers['solver']
+    gui.game_widget.update = timers['game_widget']
+    gui.solver_widget.update = timers['solver_widget']
+    for t in timers.values():
+        t.samples.clear()
+
+    results = {'total': [], 'paint': []}
+    for r, c, button in clicks:
+        widget = gui.game_widget.board_squares[r][c]
+        start = time.perf_counter()
+        QTest.mouseClick(widget, BUTTONS[button])
+        clicked = time.perf_counter()
+        app.processEvents()
+        end = time.perf_counter()
+        results['total'].append(end - start)
+        results['paint'].append(end - clicked)
+
+    results['board'] = timers['board'].samples
+    results['solver'] = timers['solver'].samples
+    results['widgets'] = [a + b for a, b in zip(timers['game_widget'].samples, timers['solver_widget'].samples)]
+    gui.close()
+    return results
+
+
+def report(n: int, n_stars: int, results) -> None:
+    print(f"{n}x{n} {n_stars}★, {len(results['total'])} clicks (ms)")
+    print(f"  {'stage':<10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for stage in ['total', 'board', 'solver', 'widgets', 'paint']:
+        samples = results[stage]
+        row = [percentile(samples, p) * 1000 for p in (50, 95, 99)]
+        print(f"  {stage:<10}{row[0]:>10.2f}{row[1]:>10.2f}{row[2]:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Star Battle GUI latency benchmark.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 10, 15, 20, 25],
+                        help="Board sizes to benchmark.")
+    parser.add_argument("--n_stars", type=int, default=1,
+                        help="Stars per row, col and segment.")
+    parser.add_argument("--clicks", type=str, default=None,
+                        help="JSON click recording to replay (sets the board size).")
+    parser.add_argument("--record", type=str, default=None,
+                        help="Write the generated click sequences to this JSON file.")
+    parser.add_argument("--n_clicks", type=int, default=100,
+                        help="Number of random clicks per board size.")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed for the random click sequences.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Benchmark the IncrementalSolver instead of the Solver.")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+
+    if args.clicks:
+        with open(args.clicks) as f:
+            data = json.load(f)
+        recordings = data if isinstance(data, list) else [data]
+    else:
+        recordings = [{'board_size': n, 'n_stars': args.n_stars,
+                       'clicks': random_clicks(n, args.n_clicks, args.seed)}
+                      for n in args.sizes]
+
+    if args.record:
+        with open(args.record, 'w') as f:
+            json.dump(recordings, f)
+
+    for recording in recordings:
+        n = recording['board_size']
+        n_stars = recording.get('n_stars', args.n_stars)
+        board = make_board(n, n_stars, recording.get('board_segments'))
+        results = run(app, board, recording['clicks'], args.incremental)
+        report(n, n_stars, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+'''
+Timed check of the conflict-driven Search on large boards
+
+Generates solvable n x n boards with k stars per unit: a random solution is
+found on a board whose segments are its rows, its stars are grouped k at a
+time by proximity and each group is grown into a segment. Each board is then
+solved from scratch and the wall time reported. With --max_seconds the exit
+status is 1 if any board takes longer, so the check can gate a change.
+'''
+import argparse
+import random
+import sys
+import time
+from board import Board
+from search import Search
+
+
+def make_board(n: int, n_stars: int, segments) -> Board:
+    board = Board()
+    board.n_stars = n_stars
+    board.board_size = n
+    board.board_state = [[0] * n for _ in range(n)]
+    board.board_segments = segments
+    return board
+
+
+def random_board(n: int, n_stars: int, seed: int = 0) -> Board:
+    """
+    Random solvable board, its segments grown around the stars of a random solution
+    """
+    rng = random.Random(seed)
+
+    # A random solution, row segments leave only the row/col/adjacency rules
+    search = Search(make_board(n, n_stars, [[r] * n for r in range(n)]))
+    search.activity = [rng.random() for _ in range(n * n)]
+    search.rebuild_order()
+    solution = search.solve()
+    if solution is None:
+        raise ValueError(f"No {n_stars} star solution on a {n}x{n} board")
+    stars = [(r, c) for r in range(n) for c in range(n) if solution[r][c] == 1]
+    rng.shuffle(stars)
+
+    # Group the stars n_stars at a time, nearest first, one segment per group
+    segments = [[-1] * n for _ in range(n)]
+    frontier = []
+    s = 0
+    while stars:
+        r0, c0 = stars.pop()
+        group = [(r0, c0)]
+        while len(group) < n_stars:
+            nearest = min(stars, key=lambda rc: abs(rc[0] - r0) + abs(rc[1] - c0))
+            stars.remove(nearest)
+            group.append(nearest)
+        for r, c in group:
+            segments[r][c] = s
+            frontier.append((r, c))
+        s += 1
+
+    # Grow the segments into the free squares in random order
+    while frontier:
+        r, c = frontier.pop(rng.randrange(len(frontier)))
+        for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+            rr, cc = r + dr, c + dc
+            if 0 <= rr < n and 0 <= cc < n and segments[rr][cc] == -1:
+                segments[rr][cc] = segments[r][c]
+                frontier.append((rr, cc))
+    return make_board(n, n_stars, segments)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Star Battle search timing check.")
+    parser.add_argument("--boards", type=str, nargs="+", default=["20x4", "25x5"],
+                        help="Board sizes and stars as NxK, e.g. 20x4.")
+    parser.add_argument("--seeds", type=int, default=3,
+                        help="Random boards per size.")
+    parser.add_argument("--max_seconds", type=float, default=None,
+                        help="Fail (exit status 1) if any board takes longer than this.")
+    args = parser.parse_args()
+
+    slowest = 0.0
+    print(f"{'board':<10}{'seed':>6}{'seconds':>10}{'decisions':>11}{'conflicts':>11}")
+    for spec in args.boards:
+        n, n_stars = (int(x) for x in spec.split('x'))
+        for seed in range(args.seeds):
+            board = random_board(n, n_stars, seed)
+            start = time.perf_counter()
+            search = Search(board)
+            solution = search.solve()
+            elapsed = time.perf_counter() - start
+            if solution is None:
+                raise ValueError(f"Search found no solution for {spec} seed {seed}")
+            slowest = max(slowest, elapsed)
+            print(f"{spec:<10}{seed:>6}{elapsed:>10.2f}"
+                  f"{search.stats['decisions']:>11}{search.stats['conflicts']:>11}")
+
+    if args.max_seconds is not None and slowest > args.max_seconds:
+        print(f"Slowest board took {slowest:.2f}s, over the {args.max_seconds:.2f}s limit")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -141,15 +141,22 @@ class Board():
         Load in board segments from image using CV
         Load in any already-populated stars and X's (TODO)
         """
+        # Image, decoded straight to greyscale
+        img_grey = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+        if img_grey is None:
+            raise ValueError(f"Image could not be loaded from: {img_path}")
 
+        self.load_from_array(img_grey)
 
-        # Image
-        img = cv2.imread(img_path)
-        if img is None:
-            raise ValueError("Image could not be loaded from: {img_path}")
-
+    def load_from_array(self, img: np.ndarray) -> None:
+        """
+        Load a board from an already decoded image (greyscale or BGR)
+        """
         # Greyscale
-        img_grey = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        if img.ndim == 3:
+            img_grey = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        else:
+            img_grey = img
 
         # Threshold
         _, binary = cv2.threshold(img_grey, 128, 255, cv2.THRESH_BINARY_INV)
@@ -159,8 +166,8 @@ class Board():
 
         # Get outline
         contours, _ = cv2.findContours(eroded, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        outline = img.copy()
-        cv2.drawContours(outline, contours, -1, (0, 255, 0), 2)
+        if not contours:
+            raise ValueError("No board outline found in image")
 
         # Crop so only game board is considered
         x, y, w, h = cv2.boundingRect(contours[0])
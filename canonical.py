@@ -0,0 +1,123 @@
+'''
+Canonical forms of Star-Battle puzzles
+
+Two boards are the same puzzle if one can be turned into the other by one of the
+8 symmetries of the square and a renumbering of the segments. The canonical form
+picks a single representative of that class so it can be used for deduplication
+and as a cache key.
+'''
+import hashlib
+from board import Board
+
+# Number of symmetries of the square (4 rotations, each optionally mirrored)
+N_SYMMETRIES = 8
+
+
+def rotate(grid):
+    """
+    Rotate a square grid 90 degrees clockwise
+    """
+    return [list(row) for row in zip(*grid[::-1])]
+
+
+def mirror(grid):
+    """
+    Mirror a square grid left to right
+    """
+    return [list(row[::-1]) for row in grid]
+
+
+def apply_symmetry(grid, k: int):
+    """
+    Apply symmetry k (0-7) to a square grid
+
+    k % 4 is the number of clockwise rotations, k >= 4 mirrors after rotating
+    """
+    for _ in range(k % 4):
+        grid = rotate(grid)
+    if k >= 4:
+        grid = mirror(grid)
+    return [list(row) for row in grid]
+
+
+def invert_symmetry(grid, k: int):
+    """
+    Undo symmetry k on a square grid, mapping a canonical grid back to the original
+    """
+    if k >= 4:
+        grid = mirror(grid)
+    for _ in range((4 - k % 4) % 4):
+        grid = rotate(grid)
+    return [list(row) for row in grid]
+
+
+def relabel_segments(board_segments):
+    """
+    Renumber segments in order of first appearance (row-major scan)
+    """
+    labels = {}
+    relabelled = []
+    for row in board_segments:
+        new_row = []
+        for s in row:
+            if s not in labels:
+                labels[s] = len(labels)
+            new_row.append(labels[s])
+        relabelled.append(new_row)
+    return relabelled
+
+
+def canonicalize(board_segments, n_stars: int, board_state=None):
+    """
+    Find the canonical form of a layout (and optionally a state)
+
+    Returns (form, k) where form is a hashable tuple
+    (board_size, n_stars, segments, state) and k is the symmetry that maps the
+    input onto the canonical form. state is None if no board_state was given.
+    """
+    n = len(board_segments)
+
+    best = None
+    best_k = 0
+    for k in range(N_SYMMETRIES):
+        segments = relabel_segments(apply_symmetry(board_segments, k))
+        key = (tuple(tuple(row) for row in segments),)
+        if board_state is not None:
+            state = apply_symmetry(board_state, k)
+            key += (tuple(tuple(int(v) for v in row) for row in state),)
+        if best is None or key < best:
+            best = key
+            best_k = k
+
+    state = best[1] if board_state is not None else None
+    # Plain ints, so NumPy scalars give the same form, repr and hash
+    return (n, int(n_stars), best[0], state), best_k
+
+
+def canonical_hash(board_segments, n_stars: int, board_state=None) -> str:
+    """
+    Stable hex digest of the canonical form, suitable for file names and cache keys
+    """
+    form, _ = canonicalize(board_segments, n_stars, board_state)
+    return hashlib.sha1(repr(form).encode()).hexdigest()
+
+
+def board_key(board: Board, include_state: bool = False) -> str:
+    """
+    Canonical hash of a Board's layout, and of its state if include_state is set
+    """
+    state = board.board_state if include_state else None
+    return canonical_hash(board.board_segments, board.n_stars, state)
+
+
+def dedupe(boards, include_state: bool = False):
+    """
+    Yield boards from an iterable, skipping any equivalent to one already seen
+    """
+    seen = set()
+    for board in boards:
+        key = board_key(board, include_state)
+        if key in seen:
+            continue
+        seen.add(key)
+        yield board
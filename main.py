@@ -1,7 +1,7 @@
 import argparse
 import sys
 from board import Board, DefaultBoard
-from solver import Solver
+from solver import Solver, IncrementalSolver
 from gui import GameGUI
 from PyQt5.QtWidgets import QApplication
 import os
@@ -23,6 +23,8 @@ def main():
                         help="File path of the board image to load.")
     parser.add_argument("--autosolve", type=bool, default=False, 
                         help="If True, automatically runs the solver.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only re-derive the deductions affected by each click.")
     args = parser.parse_args()
     
     app = QApplication(sys.argv)
@@ -41,7 +43,7 @@ def main():
         board = DefaultBoard()
     
     # Initialize the solver
-    solver = Solver(board)
+    solver = IncrementalSolver(board) if args.incremental else Solver(board)
 
     # Set up the game GUI
     gui = GameGUI(board, solver)
@@ -0,0 +1,126 @@
+'''
+Parallel search of a single Star-Battle board
+
+The search tree is split by the legal placements of the most constrained
+segment (repeatedly, until there are several tasks per worker). Each task is
+an ordinary Board with those stars and Xs filled in, solved by Search, so
+every worker runs exactly the serial logic on a disjoint subtree.
+
+Workers pull one task at a time from the pool's shared queue, so idle workers
+pick up the remaining subtrees while others are still busy. The pool is
+terminated as soon as enough solutions are found.
+'''
+from multiprocessing import Pool, cpu_count
+from board import Board
+from placements import PlacementTable
+from search import Search
+from queens import fast_solutions
+
+
+def board_masks(board: Board):
+    """
+    Star and X bitmasks of a board state
+    """
+    n = board.board_size
+    stars, xs = 0, 0
+    for r in range(n):
+        for c in range(n):
+            if board.board_state[r][c] == 1:
+                stars |= 1 << (r * n + c)
+            elif board.board_state[r][c] == 2:
+                xs |= 1 << (r * n + c)
+    return stars, xs
+
+
+def split(board: Board, n_tasks: int):
+    """
+    Split a board into at least n_tasks disjoint (stars, xs) subproblems where possible
+
+    Each round branches every task on the placements of its segment with the
+    fewest surviving placements. Subproblems the placement tables already
+    prove impossible are dropped.
+    """
+    table = PlacementTable(board)
+    tasks = [board_masks(board)]
+
+    while len(tasks) < n_tasks:
+        new_tasks = []
+        progress = False
+        for stars, xs in tasks:
+            deduced = table.deduce(stars, xs)
+            if deduced is None:
+                continue
+            stars, xs = deduced
+
+            best = None
+            for i, placements in enumerate(table.tables):
+                if placements is None:
+                    continue
+                surviving = table.filter(i, stars, xs)
+                if len(surviving) > 1 and (best is None or len(surviving) < len(best[1])):
+                    best = (i, surviving)
+
+            if best is None:
+                new_tasks.append((stars, xs))
+                continue
+            progress = True
+            i, surviving = best
+            segment = table.segment_masks[i]
+            for p in surviving:
+                new_tasks.append((stars | p, xs | (segment & ~p)))
+        tasks = new_tasks
+        if not progress:
+            break
+    return tasks
+
+
+def solve_task(args):
+    """
+    Worker: solve one subproblem with the serial search, returns its solutions
+    """
+    n, n_stars, board_segments, stars, xs, limit = args
+    board = Board()
+    board.n_stars = n_stars
+    board.board_size = n
+    board.board_segments = board_segments
+    board.board_state = [[1 if stars >> (r * n + c) & 1 else 2 if xs >> (r * n + c) & 1 else 0
+                          for c in range(n)] for r in range(n)]
+    return list(Search(board).solutions(limit))
+
+
+def parallel_solutions(board: Board, limit: int = 2, processes: int = None, tasks_per_worker: int = 4):
+    """
+    Find up to limit solutions of a board using a process pool
+
+    limit=2 checks uniqueness. Remaining workers are cancelled once limit
+    solutions are found.
+    """
+    # 1 star boards solve faster serially than a pool can start
+    if board.n_stars == 1:
+        return fast_solutions(board, limit)
+
+    processes = processes or cpu_count()
+    n = board.board_size
+    segments = [[int(s) for s in row] for row in board.board_segments]
+
+    tasks = split(board, processes * tasks_per_worker)
+    args = [(n, board.n_stars, segments, stars, xs, limit) for stars, xs in tasks]
+
+    solutions = []
+    if not args:
+        return solutions
+    # Leaving the with block terminates the workers still running
+    with Pool(processes) as pool:
+        for result in pool.imap_unordered(solve_task, args, chunksize=1):
+            solutions.extend(result)
+            if len(solutions) >= limit:
+                break
+    return solutions[:limit]
+
+
+def parallel_solve(board: Board, processes: int = None):
+    """
+    Find a solution using a process pool, returns a board_state style grid or None
+    """
+    solutions = parallel_solutions(board, limit=1, processes=processes)
+    return solutions[0] if solutions else None
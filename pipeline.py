@@ -0,0 +1,46 @@
+'''
+Streaming board ingestion from images
+
+Decodes and parses images on a thread pool (OpenCV releases the GIL, so
+threads run in parallel) and yields results in input order. At most
+max_in_flight images are queued or held at once, so memory stays bounded
+however many paths are given.
+'''
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from board import Board
+
+
+def load_board(img_path: str):
+    """
+    Load one board, returns (path, board, error) with error None on success
+    """
+    try:
+        board = Board()
+        board.load_from_image(img_path)
+        return img_path, board, None
+    except Exception as e:
+        return img_path, None, e
+
+
+def load_boards(img_paths, workers: int = None, max_in_flight: int = None):
+    """
+    Yield (path, board, error) for every image path, in order
+
+    img_paths may be any iterable (e.g. a generator over a directory) and is
+    consumed lazily. A failed image yields board None and the exception
+    instead of stopping the run.
+    """
+    workers = workers or os.cpu_count()
+    max_in_flight = max_in_flight or 2 * workers
+
+    paths = iter(img_paths)
+    in_flight = deque()
+    with ThreadPoolExecutor(workers) as executor:
+        for path in paths:
+            in_flight.append(executor.submit(load_board, path))
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
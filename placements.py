@@ -0,0 +1,275 @@
+'''
+Precompiled per-segment star placement tables
+
+Every legal way to place n_stars non-adjacent stars in a segment is fixed by the
+layout, so it is enumerated once per board as a bitmask over the squares
+(bit r * n + c). Board stars and Xs then filter a table with bitwise ANDs:
+squares in no surviving placement must be X, and squares in every surviving
+placement must be stars.
+
+Tables are built for the canonical form of the layout only, so symmetric
+copies share one cached copy. Segments with more than MAX_PLACEMENTS
+placements are counted and dropped before anything is stored.
+'''
+import math
+from collections import OrderedDict
+from board import Board
+from canonical import canonicalize, apply_symmetry
+
+# Segments with more placements than this get no table (left to the other rules)
+MAX_PLACEMENTS = 20000
+# Total placements kept in the table cache across all layouts
+MAX_CACHED_PLACEMENTS = 200000
+
+_table_cache = OrderedDict()
+
+
+def neighbour_lists(n: int):
+    """
+    Indices of the adjacent squares of every square
+    """
+    neighbours = [[] for _ in range(n * n)]
+    for r in range(n):
+        for c in range(n):
+            for dr, dc in [(-1,-1), (-1,0), (-1,1), (0,-1), (0,1), (1,-1), (1,0), (1,1)]:
+                rr, cc = r + dr, c + dc
+                if (rr < 0) or (cc < 0) or (rr >= n) or (cc >= n):
+                    continue
+                neighbours[r * n + c].append(rr * n + cc)
+    return neighbours
+
+
+def neighbour_masks(n: int):
+    """
+    Bitmask of the adjacent squares of every square
+    """
+    masks = []
+    for squares in neighbour_lists(n):
+        mask = 0
+        for w in squares:
+            mask |= 1 << w
+        masks.append(mask)
+    return masks
+
+
+def count_placements(bits, neighbours, n_stars: int, limit: int) -> int:
+    """
+    Number of placements of n_stars non-adjacent stars on bits, counting stops past limit
+    """
+    count = 0
+
+    def place(start, blocked, left):
+        nonlocal count
+        if left == 0:
+            count += 1
+            return count <= limit
+        for i in range(start, len(bits) - left + 1):
+            b = bits[i]
+            if blocked >> b & 1:
+                continue
+            if not place(i + 1, blocked | neighbours[b], left - 1):
+                return False
+        return True
+
+    place(0, 0, n_stars)
+    return count
+
+
+def segment_placements(squares, n: int, n_stars: int, limit: int = MAX_PLACEMENTS):
+    """
+    All placements of n_stars non-adjacent stars on the given squares
+
+    Returns a list of bitmasks, or None if there are more than limit of them.
+    Oversized segments are counted (without storing anything) before enumerating.
+    """
+    neighbours = neighbour_masks(n)
+    bits = sorted(r * n + c for r, c in squares)
+    if math.comb(len(bits), n_stars) > limit and count_placements(bits, neighbours, n_stars, limit) > limit:
+        return None
+
+    placements = []
+
+    def place(start, mask, blocked, left):
+        if left == 0:
+            placements.append(mask)
+            return
+        for i in range(start, len(bits) - left + 1):
+            b = bits[i]
+            if blocked >> b & 1:
+                continue
+            place(i + 1, mask | (1 << b), blocked | neighbours[b], left - 1)
+
+    place(0, 0, 0, n_stars)
+    return placements
+
+
+def canonical_tables(form):
+    """
+    Placement tables of a canonical layout, one per canonical segment label
+
+    Cached, evicting the least recently used layouts once more than
+    MAX_CACHED_PLACEMENTS placements are held in total.
+    """
+    if form in _table_cache:
+        _table_cache.move_to_end(form)
+        return _table_cache[form][0]
+
+    n, n_stars, segments, _ = form
+    squares = {}
+    for r in range(n):
+        for c in range(n):
+            squares.setdefault(segments[r][c], []).append((r, c))
+    tables = [segment_placements(squares[s], n, n_stars) for s in range(len(squares))]
+
+    size = sum(len(t) for t in tables if t is not None)
+    _table_cache[form] = (tables, size)
+    total = sum(entry[1] for entry in _table_cache.values())
+    while total > MAX_CACHED_PLACEMENTS and len(_table_cache) > 1:
+        _, (_, evicted) = _table_cache.popitem(last=False)
+        total -= evicted
+    return tables
+
+
+def bit_tables(bit_map, size: int):
+    """
+    Byte-wise lookup tables moving every bit i of a mask to bit_map[i]
+    """
+    tables = []
+    for j in range(0, size, 8):
+        width = min(8, size - j)
+        table = [0] * (1 << width)
+        for byte in range(1, 1 << width):
+            low = byte & -byte
+            table[byte] = table[byte ^ low] | (1 << bit_map[j + low.bit_length() - 1])
+        tables.append(table)
+    return tables
+
+
+def remap(mask: int, tables) -> int:
+    """
+    Move the bits of a mask with lookup tables from bit_tables
+    """
+    result = 0
+    for table in tables:
+        if mask & 0xFF:
+            result |= table[mask & 0xFF]
+        mask >>= 8
+        if not mask:
+            break
+    return result
+
+
+class PlacementTable():
+    """
+    Placement tables for every segment of a board
+
+    The tables are shared with the cache and stay in the canonical frame of
+    the layout. Masks are moved into that frame on the way in and back out on
+    the way out, which is free when the board already is canonical.
+    """
+    def __init__(self, board: Board) -> None:
+        n = board.board_size
+        self.n = n
+
+        form, k = canonicalize(board.board_segments, board.n_stars)
+        tables = canonical_tables(form)
+
+        # Canonical square of each board square, and the canonical segment label of each segment
+        index = apply_symmetry([[r * n + c for c in range(n)] for r in range(n)], k)
+        to_canonical = [0] * (n * n)
+        from_canonical = [0] * (n * n)
+        labels = [0] * n
+        for r in range(n):
+            for c in range(n):
+                v = index[r][c]
+                to_canonical[v] = r * n + c
+                from_canonical[r * n + c] = v
+                labels[int(board.board_segments[v // n][v % n])] = form[2][r][c]
+
+        if k == 0:
+            self.to_canonical = self.from_canonical = None
+        else:
+            self.to_canonical = bit_tables(to_canonical, n * n)
+            self.from_canonical = bit_tables(from_canonical, n * n)
+
+        self.tables = [tables[labels[i]] for i in range(n)]
+        # Neighbours and segment masks in the canonical frame
+        self.neighbours = neighbour_masks(n)
+        label_masks = [0] * n
+        for r in range(n):
+            for c in range(n):
+                label_masks[form[2][r][c]] |= 1 << (r * n + c)
+        self.canonical_masks = [label_masks[labels[i]] for i in range(n)]
+
+        self.segment_masks = [0] * n
+        for r in range(n):
+            for c in range(n):
+                self.segment_masks[int(board.board_segments[r][c])] |= 1 << (r * n + c)
+
+    def canonical(self, mask: int) -> int:
+        return mask if self.to_canonical is None else remap(mask, self.to_canonical)
+
+    def original(self, mask: int) -> int:
+        return mask if self.from_canonical is None else remap(mask, self.from_canonical)
+
+    def surviving(self, i: int, stars: int, xs: int):
+        """
+        Placements of segment i consistent with canonical-frame star and X masks
+        """
+        seg_stars = stars & self.canonical_masks[i]
+        forbidden = xs
+        s = stars
+        while s:
+            low = s & -s
+            forbidden |= self.neighbours[low.bit_length() - 1]
+            s ^= low
+        return [p for p in self.tables[i] if not (p & forbidden) and (p & seg_stars) == seg_stars]
+
+    def filter(self, i: int, stars: int, xs: int):
+        """
+        Placements of segment i consistent with the star and X masks
+        """
+        surviving = self.surviving(i, self.canonical(stars), self.canonical(xs))
+        return [self.original(p) for p in surviving]
+
+    def forced(self, i: int, stars: int, xs: int):
+        """
+        (forced stars, forced Xs) in segment i, or None if no placement fits
+        """
+        surviving = self.surviving(i, self.canonical(stars), self.canonical(xs))
+        if not surviving:
+            return None
+        union = 0
+        intersection = self.canonical_masks[i]
+        for p in surviving:
+            union |= p
+            intersection &= p
+        return self.original(intersection), self.original(self.canonical_masks[i] & ~union)
+
+    def deduce(self, stars: int, xs: int):
+        """
+        Forced stars and Xs over all segments, repeated until nothing changes
+
+        Returns (stars, xs) masks including the inputs, or None on a contradiction
+        """
+        stars, xs = self.canonical(stars), self.canonical(xs)
+        changed = True
+        while changed:
+            changed = False
+            for i, table in enumerate(self.tables):
+                if table is None:
+                    continue
+                surviving = self.surviving(i, stars, xs)
+                if not surviving:
+                    return None
+                union = 0
+                intersection = self.canonical_masks[i]
+                for p in surviving:
+                    union |= p
+                    intersection &= p
+                new_xs = xs | (self.canonical_masks[i] & ~union)
+                new_stars = stars | intersection
+                if new_xs != xs or new_stars != stars:
+                    stars, xs = new_stars, new_xs
+                    changed = True
+        return self.original(stars), self.original(xs)
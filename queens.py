@@ -0,0 +1,140 @@
+'''
+Fast path for 1 star (Queens-style) boards
+
+With one star per row, col and segment a solution is a permutation, so the
+search needs no counting at all. The board is a single integer bitmask of
+squares still free (bit r * n + c). Placing a star clears its row, column,
+segment and neighbours in one AND, and each step branches on the unused row,
+column or segment with the fewest free squares. States (free squares and
+used units) known to have no solution are remembered, up to MAX_DEAD of them.
+
+Boards with more stars per unit, and the rare 1 star board where this
+search runs out of its node budget, fall back to the general Search.
+'''
+from board import Board
+from search import Search
+
+# Cap on remembered dead states, to bound memory on large boards
+MAX_DEAD = 1 << 18
+# States visited before giving up and handing the board to Search
+MAX_NODES = 1 << 14
+
+
+def queens_solutions(board: Board, limit: int = 2, max_nodes: int = MAX_NODES):
+    """
+    Up to limit solutions of a 1 star board as board_state style grids
+
+    Returns None if the search visits more than max_nodes states without finishing
+    """
+    n = board.board_size
+    state = board.board_state
+
+    # Row, col and segment masks, in one list of units
+    units = [0] * (3 * n)
+    for r in range(n):
+        for c in range(n):
+            bit = 1 << (r * n + c)
+            units[r] |= bit
+            units[n + c] |= bit
+            units[2 * n + int(board.board_segments[r][c])] |= bit
+
+    # Everything a star on each square rules out, including itself, and the
+    # units it fills (bit i for units[i])
+    clear = []
+    fills = []
+    for r in range(n):
+        for c in range(n):
+            s = int(board.board_segments[r][c])
+            fills.append((1 << r) | (1 << (n + c)) | (1 << (2 * n + s)))
+            mask = units[r] | units[n + c] | units[2 * n + s]
+            for dr in (-1, 0, 1):
+                for dc in (-1, 0, 1):
+                    if 0 <= r + dr < n and 0 <= c + dc < n:
+                        mask |= 1 << ((r + dr) * n + c + dc)
+            clear.append(mask)
+
+    # Squares marked X are never free, preset stars are placed up front
+    free = (1 << (n * n)) - 1
+    stars = 0
+    used = 0
+    for r in range(n):
+        for c in range(n):
+            v = r * n + c
+            if state[r][c] == 2:
+                free &= ~(1 << v)
+    for r in range(n):
+        for c in range(n):
+            v = r * n + c
+            if state[r][c] == 1:
+                if not free >> v & 1:
+                    return []
+                free &= ~clear[v]
+                stars |= 1 << v
+                used |= fills[v]
+
+    solutions = []
+    dead = set()
+    nodes = 0
+
+    def place(free, stars, used, left):
+        # Returns False once the node budget is spent
+        nonlocal nodes
+        if left == 0:
+            solutions.append([[1 if stars >> (r * n + c) & 1 else 2 for c in range(n)] for r in range(n)])
+            return True
+        if (free, used) in dead:
+            return True
+        nodes += 1
+        if nodes > max_nodes:
+            return False
+
+        # Unused unit with the fewest free squares, a unit with none is a dead end
+        best = None
+        best_count = n * n + 1
+        for i, unit in enumerate(units):
+            if used >> i & 1:
+                continue
+            count = (free & unit).bit_count()
+            if count < best_count:
+                best, best_count = unit, count
+                if count == 0:
+                    break
+        if best_count == 0:
+            return True
+
+        before = len(solutions)
+        options = free & best
+        while options:
+            low = options & -options
+            options ^= low
+            v = low.bit_length() - 1
+            if not place(free & ~clear[v], stars | low, used | fills[v], left - 1):
+                return False
+            if len(solutions) >= limit:
+                return True
+        if len(solutions) == before and len(dead) < MAX_DEAD:
+            dead.add((free, used))
+        return True
+
+    if limit > 0 and not place(free, stars, used, n - stars.bit_count()):
+        return None
+    return solutions
+
+
+def fast_solutions(board: Board, limit: int = 2):
+    """
+    Up to limit solutions, using the 1 star fast path when it applies
+    """
+    if board.n_stars == 1:
+        solutions = queens_solutions(board, limit)
+        if solutions is not None:
+            return solutions
+    return list(Search(board).solutions(limit))
+
+
+def fast_solve(board: Board):
+    """
+    A solution grid or None, using the 1 star fast path when it applies
+    """
+    solutions = fast_solutions(board, limit=1)
+    return solutions[0] if solutions else None
@@ -0,0 +1,594 @@
+'''
+Conflict-driven search for Star-Battle boards
+
+Each square is a boolean variable (star or X). Literals are signed ints:
++(v + 1) places a star on square v, -(v + 1) places an X.
+
+The row, col, segment and adjacency rules are propagated directly, using star
+and open square counts per unit that are kept on assignment and undone on
+backtrack. Each segment with a placement table (see placements.py) also
+filters its legal placements as its squares are assigned, forcing the squares
+that are a star in all or none of them. Every propagation records a reason
+clause, so a contradiction can be analysed into a learned nogood that is kept
+across restarts and used to backjump to the decision that caused it.
+'''
+import heapq
+from board import Board
+from placements import PlacementTable, neighbour_lists
+
+
+class Clause():
+    """
+    Learned clause (disjunction of literals) with an activity score for eviction
+
+    Bumped whenever it takes part in a conflict, so eviction keeps the useful ones
+    """
+    __slots__ = ('lits', 'activity', 'deleted')
+
+    def __init__(self, lits) -> None:
+        self.lits = lits
+        self.activity = 0.0
+        self.deleted = False
+
+
+def luby(i: int) -> int:
+    """
+    i-th element (0 indexed) of the Luby restart sequence 1 1 2 1 1 2 4 ...
+    """
+    size, seq = 1, 0
+    while size < i + 1:
+        seq += 1
+        size = 2 * size + 1
+    while size - 1 != i:
+        size = (size - 1) >> 1
+        seq -= 1
+        i = i % size
+    return 1 << seq
+
+
+class Search():
+    def __init__(self, board: Board, max_learnts: int = 20000, restart_base: int = 100,
+                 placements: bool = True) -> None:
+        self.board = board
+        n = board.board_size
+        self.n = n
+        self.n_stars = board.n_stars
+
+        # Memory cap on learned clauses. Half are evicted whenever learnt_limit
+        # is reached, which starts lower and grows 10% per eviction up to the cap.
+        self.max_learnts = max_learnts
+        self.learnt_limit = min(max_learnts, 2000)
+        # Conflicts between restarts are restart_base * luby(i)
+        self.restart_base = restart_base
+
+        # Units (rows, cols, segments) as lists of squares, and the units of each square
+        self.units = []
+        for r in range(n):
+            self.units.append([r * n + c for c in range(n)])
+        for c in range(n):
+            self.units.append([r * n + c for r in range(n)])
+        segs = {}
+        for r in range(n):
+            for c in range(n):
+                segs.setdefault(int(board.board_segments[r][c]), []).append(r * n + c)
+        # Unit index of each segment id
+        self.seg_unit = {}
+        for seg, squares in segs.items():
+            self.seg_unit[seg] = len(self.units)
+            self.units.append(squares)
+
+        self.var_units = [[] for _ in range(n * n)]
+        for i, unit in enumerate(self.units):
+            for v in unit:
+                self.var_units[v].append(i)
+
+        # Adjacent squares
+        self.neighbours = neighbour_lists(n)
+
+        # Assignment: 0 unknown, 1 star, 2 X (same codes as board_state)
+        self.value = [0] * (n * n)
+        self.level = [0] * (n * n)
+        self.reason = [None] * (n * n)
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+
+        # Stars and open squares in each unit, kept up to date by enqueue and cancel_until
+        self.unit_stars = [0] * len(self.units)
+        self.unit_open = [len(unit) for unit in self.units]
+
+        # Segment placement tables, used in their canonical frame: canonical bit
+        # of each square, stars and Xs of each segment as canonical masks, and
+        # the placements still possible with the undo stack of (level, segment, previous list)
+        self.table = None
+        self.seg_of = [int(board.board_segments[v // n][v % n]) for v in range(n * n)]
+        if placements and sorted(segs) == list(range(n)):
+            self.table = PlacementTable(board)
+            self.canon_bit = [self.table.canonical(1 << v) for v in range(n * n)]
+            self.canon_var = [0] * (n * n)
+            for v in range(n * n):
+                self.canon_var[self.canon_bit[v].bit_length() - 1] = v
+            self.seg_stars = [0] * n
+            self.seg_xs = [0] * n
+            self.surviving = list(self.table.tables)
+            self.surviving_undo = []
+        self.dirty_segs = set()
+
+        # Learned clauses and their two watched literals
+        self.learnts = []
+        # Clauses blocking solutions already found, never evicted
+        self.blocking = []
+        self.watches = {}
+
+        # Branching activity, with a heap of (-activity, square) for picking the
+        # most active open square. Entries go stale when a square is assigned
+        # or bumped and are skipped when popped.
+        self.activity = [0.0] * (n * n)
+        self.order = [(0.0, v) for v in range(n * n)]
+        self.var_inc = 1.0
+        self.cla_inc = 1.0
+
+        self.stats = {'decisions': 0, 'conflicts': 0, 'restarts': 0, 'learnts': 0, 'evicted': 0}
+
+        # Contradictory starting state
+        self.unsat = False
+        for r in range(n):
+            for c in range(n):
+                s = board.board_state[r][c]
+                if s == 0:
+                    continue
+                lit = (r * n + c + 1) if s == 1 else -(r * n + c + 1)
+                if not self.enqueue(lit, None):
+                    self.unsat = True
+
+        # Squares forced by the full placement tables, before any propagation
+        if self.table is not None and not self.unsat:
+            for i in range(n):
+                if self.propagate_placements(i, True):
+                    self.unsat = True
+
+    def lit_value(self, lit: int) -> int:
+        """
+        1 if the literal is true, -1 if it is false, 0 if unassigned
+        """
+        v = self.value[abs(lit) - 1]
+        if v == 0:
+            return 0
+        return 1 if (v == 1) == (lit > 0) else -1
+
+    def decision_level(self) -> int:
+        return len(self.trail_lim)
+
+    def enqueue(self, lit: int, reason) -> bool:
+        """
+        Assign a literal, returns False if it is already false
+        """
+        val = self.lit_value(lit)
+        if val != 0:
+            return val == 1
+        v = abs(lit) - 1
+        self.value[v] = 1 if lit > 0 else 2
+        self.level[v] = self.decision_level()
+        self.reason[v] = reason
+        self.trail.append(lit)
+
+        for i in self.var_units[v]:
+            self.unit_open[i] -= 1
+            if lit > 0:
+                self.unit_stars[i] += 1
+        if self.table is not None:
+            if lit > 0:
+                self.seg_stars[self.seg_of[v]] |= self.canon_bit[v]
+            else:
+                self.seg_xs[self.seg_of[v]] |= self.canon_bit[v]
+        return True
+
+    def propagate(self):
+        """
+        Propagate all queued assignments, returns a conflicting clause or None
+
+        Segments touched by the assignments are filtered against their
+        placement tables once the cheaper rules have nothing left to do, so a
+        burst of assignments in one segment costs one filter.
+        """
+        conflict = self.propagate_rules()
+        dirty = self.dirty_segs
+        while not conflict and dirty:
+            conflict = self.propagate_placements(dirty.pop()) or self.propagate_rules()
+        dirty.clear()
+        return conflict
+
+    def propagate_rules(self):
+        """
+        Propagate the unit, adjacency and learned clause rules over the queued assignments
+        """
+        while self.qhead < len(self.trail):
+            lit = self.trail[self.qhead]
+            self.qhead += 1
+            v = abs(lit) - 1
+
+            # A star blocks all adjacent squares
+            if lit > 0:
+                for u in self.neighbours[v]:
+                    if self.value[u] == 1:
+                        return [-(v + 1), -(u + 1)]
+                    if self.value[u] == 0:
+                        self.enqueue(-(u + 1), [-(u + 1), -(v + 1)])
+
+            # Each row, col and segment holds exactly n_stars stars
+            for i in self.var_units[v]:
+                conflict = self.propagate_unit(i, v)
+                if conflict:
+                    return conflict
+
+            # The segment's stars go on one of its legal placements, checked in propagate
+            if self.table is not None:
+                self.dirty_segs.add(self.seg_of[v])
+
+            # Learned clauses watching the literal that just became false
+            conflict = self.propagate_learnts(-lit)
+            if conflict:
+                return conflict
+        return None
+
+    def propagate_unit(self, i: int, v: int):
+        k = self.n_stars
+        n_stars = self.unit_stars[i]
+        n_open = self.unit_open[i]
+        # Nothing forced until the unit is full or needs all its open squares
+        if n_stars <= k and n_stars + n_open >= k and (n_open == 0 or k - n_stars not in (0, n_open)):
+            return None
+
+        stars, xs, unknown = [], [], []
+        for w in self.units[i]:
+            if self.value[w] == 1:
+                stars.append(w)
+            elif self.value[w] == 2:
+                xs.append(w)
+            else:
+                unknown.append(w)
+
+        if len(stars) > k:
+            # Latest stars first so the conflict involves the current level
+            stars.sort(key=lambda w: self.level[w], reverse=True)
+            return [-(w + 1) for w in stars[:k + 1]]
+        if len(stars) + len(unknown) < k:
+            return [w + 1 for w in xs]
+        if len(stars) == k:
+            stars_reason = [-(w + 1) for w in stars]
+            for u in unknown:
+                self.enqueue(-(u + 1), [-(u + 1)] + stars_reason)
+        elif len(stars) + len(unknown) == k:
+            xs_reason = [w + 1 for w in xs]
+            for u in unknown:
+                self.enqueue(u + 1, [u + 1] + xs_reason)
+        return None
+
+    def segment_lits(self, i: int):
+        """
+        Negations of the assigned squares of segment i, the reason for anything its table forces
+        """
+        lits = []
+        for w in self.units[self.seg_unit[i]]:
+            if self.value[w] == 1:
+                lits.append(-(w + 1))
+            elif self.value[w] == 2:
+                lits.append(w + 1)
+        return lits
+
+    def propagate_placements(self, i: int, force: bool = False):
+        """
+        Filter the placements of segment i and force squares they agree on
+
+        Returns a conflicting clause if no placement is left, else None
+        """
+        placements = self.surviving[i]
+        if placements is None:
+            return None
+        stars, xs = self.seg_stars[i], self.seg_xs[i]
+        if stars or xs:
+            kept = [p for p in placements if not (p & xs) and (p & stars) == stars]
+        else:
+            kept = placements
+        if len(kept) == len(placements) and not force:
+            return None
+        if kept is not placements:
+            self.surviving_undo.append((self.decision_level(), i, placements))
+            self.surviving[i] = kept
+        if not kept:
+            return self.segment_lits(i)
+
+        union = 0
+        intersection = self.table.canonical_masks[i]
+        for p in kept:
+            union |= p
+            intersection &= p
+        forced_stars = intersection & ~stars
+        forced_xs = self.table.canonical_masks[i] & ~union & ~xs
+        if not (forced_stars or forced_xs):
+            return None
+
+        reason = self.segment_lits(i)
+        while forced_stars:
+            low = forced_stars & -forced_stars
+            forced_stars ^= low
+            lit = self.canon_var[low.bit_length() - 1] + 1
+            self.enqueue(lit, [lit] + reason)
+        while forced_xs:
+            low = forced_xs & -forced_xs
+            forced_xs ^= low
+            lit = -(self.canon_var[low.bit_length() - 1] + 1)
+            self.enqueue(lit, [lit] + reason)
+        return None
+
+    def propagate_learnts(self, false_lit: int):
+        watchers = self.watches.get(false_lit)
+        if not watchers:
+            return None
+
+        value = self.value
+        kept = []
+        conflict = None
+        for clause in watchers:
+            if clause.deleted:
+                continue
+            if conflict:
+                kept.append(clause)
+                continue
+            lits = clause.lits
+            # Keep the false literal in position 1
+            if lits[0] == false_lit:
+                lits[0], lits[1] = lits[1], lits[0]
+            # Inlined lit_value, a literal is true if its square holds its sign's code
+            first = lits[0]
+            if value[abs(first) - 1] == (1 if first > 0 else 2):
+                kept.append(clause)
+                continue
+            # Look for a new literal to watch
+            for i in range(2, len(lits)):
+                q = lits[i]
+                if value[abs(q) - 1] != (2 if q > 0 else 1):
+                    lits[1], lits[i] = lits[i], lits[1]
+                    self.watches.setdefault(lits[1], []).append(clause)
+                    break
+            else:
+                kept.append(clause)
+                if not self.enqueue(lits[0], clause):
+                    conflict = clause
+        self.watches[false_lit] = kept
+        return conflict
+
+    def analyze(self, conflict):
+        """
+        First-UIP conflict analysis, returns (learned clause, backjump level)
+        """
+        seen = set()
+        learnt = [None]
+        counter = 0
+        p = None
+        idx = len(self.trail) - 1
+        clause = conflict
+        current = self.decision_level()
+
+        while True:
+            if isinstance(clause, Clause):
+                self.bump_clause(clause)
+                clause = clause.lits
+            for q in clause:
+                v = abs(q) - 1
+                if p is not None and v == abs(p) - 1:
+                    continue
+                if v in seen or self.level[v] == 0:
+                    continue
+                seen.add(v)
+                self.bump_var(v)
+                if self.level[v] == current:
+                    counter += 1
+                else:
+                    learnt.append(q)
+
+            while abs(self.trail[idx]) - 1 not in seen:
+                idx -= 1
+            p = self.trail[idx]
+            idx -= 1
+            counter -= 1
+            if counter == 0:
+                break
+            clause = self.reason[abs(p) - 1]
+
+        learnt[0] = -p
+
+        # Drop literals implied by the others: their reason only holds literals already in the clause
+        in_learnt = {abs(q) - 1 for q in learnt}
+        minimised = [learnt[0]]
+        for q in learnt[1:]:
+            reason = self.reason[abs(q) - 1]
+            if reason is None:
+                minimised.append(q)
+                continue
+            lits = reason.lits if isinstance(reason, Clause) else reason
+            if not all(abs(r) - 1 in in_learnt or self.level[abs(r) - 1] == 0 for r in lits if r != -q):
+                minimised.append(q)
+        learnt = minimised
+        if len(learnt) == 1:
+            return learnt, 0
+
+        # Watch the literal with the highest level in position 1
+        j = max(range(1, len(learnt)), key=lambda i: self.level[abs(learnt[i]) - 1])
+        learnt[1], learnt[j] = learnt[j], learnt[1]
+        return learnt, self.level[abs(learnt[1]) - 1]
+
+    def bump_var(self, v: int):
+        self.activity[v] += self.var_inc
+        if self.activity[v] > 1e100:
+            self.activity = [a * 1e-100 for a in self.activity]
+            self.var_inc *= 1e-100
+            self.rebuild_order()
+        elif self.value[v] == 0:
+            heapq.heappush(self.order, (-self.activity[v], v))
+
+    def bump_clause(self, clause: Clause):
+        clause.activity += self.cla_inc
+        if clause.activity > 1e20:
+            for learnt in self.learnts:
+                learnt.activity *= 1e-20
+            self.cla_inc *= 1e-20
+
+    def rebuild_order(self):
+        """
+        Rebuild the branching heap from the open squares, dropping stale entries
+        """
+        self.order = [(-self.activity[v], v) for v in range(self.n * self.n) if self.value[v] == 0]
+        heapq.heapify(self.order)
+
+    def cancel_until(self, level: int):
+        if self.decision_level() <= level:
+            return
+        for lit in self.trail[self.trail_lim[level]:]:
+            v = abs(lit) - 1
+            self.value[v] = 0
+            self.reason[v] = None
+            heapq.heappush(self.order, (-self.activity[v], v))
+            for i in self.var_units[v]:
+                self.unit_open[i] += 1
+                if lit > 0:
+                    self.unit_stars[i] -= 1
+            if self.table is not None:
+                if lit > 0:
+                    self.seg_stars[self.seg_of[v]] &= ~self.canon_bit[v]
+                else:
+                    self.seg_xs[self.seg_of[v]] &= ~self.canon_bit[v]
+        if self.table is not None:
+            undo = self.surviving_undo
+            while undo and undo[-1][0] > level:
+                _, i, placements = undo.pop()
+                self.surviving[i] = placements
+        del self.trail[self.trail_lim[level]:]
+        del self.trail_lim[level:]
+        self.qhead = len(self.trail)
+
+    def add_learnt(self, lits):
+        """
+        Store a learned clause and assert its first literal
+        """
+        if len(lits) == 1:
+            self.enqueue(lits[0], None)
+            return
+        clause = Clause(lits)
+        self.bump_clause(clause)
+        self.cla_inc *= 1.001
+        self.learnts.append(clause)
+        self.stats['learnts'] += 1
+        self.watches.setdefault(lits[0], []).append(clause)
+        self.watches.setdefault(lits[1], []).append(clause)
+        self.enqueue(lits[0], clause)
+
+    def reduce_learnts(self):
+        """
+        Evict the less active half of the learned clauses, keeping any that are reasons
+        """
+        locked = {id(r) for r in self.reason if isinstance(r, Clause)}
+        self.learnts.sort(key=lambda cl: cl.activity)
+        keep = []
+        half = len(self.learnts) // 2
+        for i, clause in enumerate(self.learnts):
+            if i < half and len(clause.lits) > 2 and id(clause) not in locked:
+                clause.deleted = True
+                self.stats['evicted'] += 1
+            else:
+                keep.append(clause)
+        self.learnts = keep
+
+    def pick_branch(self):
+        """
+        Unassigned square with the highest activity, or None if all are assigned
+        """
+        # Stale entries pile up with every bump, start over once they dominate
+        if len(self.order) > 4 * self.n * self.n:
+            self.rebuild_order()
+        while self.order:
+            act, v = heapq.heappop(self.order)
+            if self.value[v] == 0 and -act == self.activity[v]:
+                return v
+        return None
+
+    def search(self, n_conflicts: int):
+        """
+        Search until a solution, unsat, or n_conflicts conflicts (restart)
+
+        Returns True, False or None respectively
+        """
+        conflicts = 0
+        while True:
+            conflict = self.propagate()
+            if conflict:
+                self.stats['conflicts'] += 1
+                conflicts += 1
+                if self.decision_level() == 0:
+                    return False
+                learnt, level = self.analyze(conflict)
+                self.cancel_until(level)
+                self.add_learnt(learnt)
+                self.var_inc *= 1.05
+                continue
+
+            if conflicts >= n_conflicts:
+                self.cancel_until(0)
+                return None
+            if len(self.learnts) >= self.learnt_limit:
+                self.reduce_learnts()
+                self.learnt_limit = min(self.max_learnts, int(self.learnt_limit * 1.1))
+
+            v = self.pick_branch()
+            if v is None:
+                return True
+            self.stats['decisions'] += 1
+            self.trail_lim.append(len(self.trail))
+            self.enqueue(v + 1, None)
+
+    def solve(self):
+        """
+        Find a solution, returns a board_state style grid (1 star, 2 X) or None
+        """
+        for solution in self.solutions(limit=1):
+            return solution
+        return None
+
+    def solutions(self, limit: int = 2):
+        """
+        Yield up to limit distinct solutions
+
+        Each solution found is blocked by a learned clause so the search continues
+        to the next one, e.g. limit=2 checks that a puzzle is unique.
+        """
+        n = self.n
+        found = 0
+        restarts = 0
+        while not self.unsat and found < limit:
+            status = self.search(self.restart_base * luby(restarts))
+            if status is None:
+                restarts += 1
+                self.stats['restarts'] += 1
+                continue
+            if status is False:
+                self.unsat = True
+                return
+
+            found += 1
+            grid = [[self.value[r * n + c] for c in range(n)] for r in range(n)]
+            yield grid
+
+            # Block this solution and carry on from the root, stars fixed at
+            # the root are left out as they can never be removed
+            block = [-(v + 1) for v in range(n * n) if self.value[v] == 1 and self.level[v] > 0]
+            self.cancel_until(0)
+            if not block:
+                self.unsat = True
+                return
+            if len(block) == 1:
+                self.enqueue(block[0], None)
+                continue
+            clause = Clause(block)
+            self.blocking.append(clause)
+            self.watches.setdefault(block[0], []).append(clause)
+            self.watches.setdefault(block[1], []).append(clause)
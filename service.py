@@ -0,0 +1,254 @@
+'''
+Local Star-Battle solve service
+
+Long-running server that keeps a warm pool of worker processes (board,
+solver, search and OpenCV already imported) and answers solve requests over
+a Unix socket or localhost TCP. The protocol is one JSON object per line in
+each direction:
+
+    {"id": 1, "op": "solve", "n_stars": 1, "board_segments": [[...], ...], "limit": 2}
+    {"id": 2, "op": "deduce", "image": "imgs/img0.PNG"}
+
+Optional "board_state" gives stars and Xs already placed. Responses carry the
+request id and either "solutions" (solve) or "information_grid" (deduce),
+or "ok": false with an "error" message.
+
+Requests are read into a bounded queue. When it is full the server stops
+reading from clients until workers catch up.
+'''
+import argparse
+import asyncio
+import json
+import os
+import socket
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from board import Board
+from solver import Solver
+from queens import fast_solutions
+from canonical import canonicalize, apply_symmetry, invert_symmetry
+
+# Solutions and information grids cached per worker, keyed on the canonical
+# form of layout and state
+CACHE_SIZE = 1024
+_cache = OrderedDict()
+
+
+def warm():
+    """
+    Run once in each worker so the pool is started before the first request
+    """
+    return os.getpid()
+
+
+def make_board(request) -> Board:
+    """
+    Board from a request, either an image path or a layout
+    """
+    board = Board()
+    if 'image' in request:
+        board.load_from_image(request['image'])
+    else:
+        segments = request['board_segments']
+        n = len(segments)
+        board.n_stars = request.get('n_stars', 1)
+        board.board_size = n
+        board.board_segments = segments
+        board.board_state = [[0] * n for _ in range(n)]
+
+    if request.get('board_state') is not None:
+        board.board_state = [list(row) for row in request['board_state']]
+    return board
+
+
+def solve(board: Board, limit: int):
+    """
+    Solutions of a board, cached in the canonical frame so symmetric copies hit
+    """
+    form, k = canonicalize(board.board_segments, board.n_stars, board.board_state)
+    key = (form, limit)
+    if key in _cache:
+        _cache.move_to_end(key)
+        solutions = _cache[key]
+    else:
+        solutions = [apply_symmetry(s, k) for s in fast_solutions(board, limit)]
+        _cache[key] = solutions
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return [invert_symmetry(s, k) for s in solutions]
+
+
+def deduce(board: Board):
+    """
+    Information grid of a board, cached in the canonical frame like solve
+    """
+    form, k = canonicalize(board.board_segments, board.n_stars, board.board_state)
+    key = (form, 'deduce')
+    if key in _cache:
+        _cache.move_to_end(key)
+        grid = _cache[key]
+    else:
+        board.update()
+        solver = Solver(board)
+        solver.update()
+        grid = apply_symmetry([[int(v) for v in row] for row in solver.information_grid], k)
+        _cache[key] = grid
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return invert_symmetry(grid, k)
+
+
+def handle_request(request):
+    """
+    Worker: answer a single request
+    """
+    try:
+        op = request.get('op', 'solve')
+        if op not in ('solve', 'deduce'):
+            raise ValueError(f"Unknown op: {op}")
+        limit = request.get('limit', 1)
+        if op == 'solve' and (type(limit) is not int or limit <= 0):
+            raise ValueError(f"limit must be a positive integer, got {limit!r}")
+
+        board = make_board(request)
+        if op == 'solve':
+            result = {'solutions': solve(board, limit)}
+        else:
+            result = {'information_grid': deduce(board)}
+        result['ok'] = True
+    except Exception as e:
+        result = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+    result['id'] = request.get('id')
+    return result
+
+
+class Client():
+    """
+    Connection state: the writer, a write lock and the number of requests in flight
+    """
+    def __init__(self, writer) -> None:
+        self.writer = writer
+        self.lock = asyncio.Lock()
+        self.pending = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    async def send(self, response):
+        async with self.lock:
+            if not self.writer.is_closing():
+                self.writer.write((json.dumps(response) + '\n').encode())
+                await self.writer.drain()
+
+
+class SolveService():
+    def __init__(self, workers: int = None, max_queue: int = 64) -> None:
+        self.workers = workers or os.cpu_count()
+        self.max_queue = max_queue
+        self.executor = None
+        self.queue = None
+        self.dispatchers = []
+
+    async def start(self):
+        self.executor = ProcessPoolExecutor(self.workers)
+        self.queue = asyncio.Queue(self.max_queue)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.executor, warm) for _ in range(self.workers)])
+        self.dispatchers = [asyncio.create_task(self.dispatch()) for _ in range(self.workers)]
+
+    async def dispatch(self):
+        """
+        Pass queued requests to the pool, one in flight per worker
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            request, client = await self.queue.get()
+            try:
+                response = await loop.run_in_executor(self.executor, handle_request, request)
+            except Exception as e:
+                response = {'id': request.get('id'), 'ok': False, 'error': f"{type(e).__name__}: {e}"}
+            try:
+                await client.send(response)
+            except ConnectionError:
+                pass
+            client.pending -= 1
+            if client.pending == 0:
+                client.idle.set()
+
+    async def handle(self, reader, writer):
+        """
+        Read requests from one client, responses are written as they complete
+        """
+        client = Client(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as e:
+                    await client.send({'id': None, 'ok': False, 'error': f"Bad request: {e}"})
+                    continue
+                if not isinstance(request, dict):
+                    await client.send({'id': None, 'ok': False, 'error': "Bad request: expected a JSON object"})
+                    continue
+                client.pending += 1
+                client.idle.clear()
+                # Blocks while the queue is full, which stops reading from this client
+                await self.queue.put((request, client))
+        except ConnectionError:
+            pass
+        finally:
+            await client.idle.wait()
+            writer.close()
+
+    async def serve(self, path: str = None, host: str = '127.0.0.1', port: int = 8765):
+        await self.start()
+        if path:
+            server = await asyncio.start_unix_server(self.handle, path=path)
+            print(f"Serving on {path}")
+        else:
+            server = await asyncio.start_server(self.handle, host=host, port=port)
+            print(f"Serving on {host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(cancel_futures=True)
+
+
+def call(request, path: str = None, host: str = '127.0.0.1', port: int = 8765):
+    """
+    Blocking client helper, sends one request and returns its response
+    """
+    if path:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+    else:
+        sock = socket.create_connection((host, port))
+    with sock, sock.makefile('rw') as f:
+        f.write(json.dumps(request) + '\n')
+        f.flush()
+        return json.loads(f.readline())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Star Battle solve service.")
+    parser.add_argument("--socket", type=str, default=None,
+                        help="Unix socket path to listen on (default: localhost TCP).")
+    parser.add_argument("--port", type=int, default=8765,
+                        help="Localhost TCP port to listen on.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: CPU count).")
+    parser.add_argument("--max_queue", type=int, default=64,
+                        help="Requests queued before the server stops reading.")
+    args = parser.parse_args()
+
+    if args.socket and os.path.exists(args.socket):
+        os.remove(args.socket)
+    service = SolveService(args.workers, args.max_queue)
+    asyncio.run(service.serve(args.socket, port=args.port))
+
+
+if __name__ == "__main__":
+    main()
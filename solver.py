@@ -1,9 +1,37 @@
 '''
 Star-Battle solver
 '''
-from board import Board, Segment
-import copy
+from board import Board
+from placements import PlacementTable, neighbour_lists
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Square and its 8 neighbours
+NEIGHBOUR_KERNEL = np.ones((3, 3), dtype=bool)
+
+
+def dilate(mask: np.ndarray) -> np.ndarray:
+    """
+    Squares on or adjacent to any True square of a 2D boolean mask
+    """
+    windows = sliding_window_view(np.pad(mask, 1), (3, 3))
+    return (windows & NEIGHBOUR_KERNEL).any(axis=(2, 3))
+
+
+def array_to_mask(flat: np.ndarray) -> int:
+    """
+    Integer bitmask (bit i for flat[i]) of a flat boolean array
+    """
+    return int.from_bytes(np.packbits(flat, bitorder='little').tobytes(), 'little')
+
+
+def mask_to_array(mask: int, size: int) -> np.ndarray:
+    """
+    Flat boolean array of the first size bits of an integer bitmask
+    """
+    data = np.frombuffer(mask.to_bytes((size + 7) // 8, 'little'), dtype=np.uint8)
+    return np.unpackbits(data, bitorder='little')[:size].astype(bool)
+
 
 class Solver():
     def __init__(self, board: Board) -> None:
@@ -16,18 +44,33 @@ class Solver():
         # - 3 star must be on square
         # - 4 x must be on square
         # - 5 1 star must be in segment
-        self.information_grid = [[0, 0, 0, 0, 0],
-                                 [0, 0, 0, 0, 0],
-                                 [0, 0, 0, 0, 0],
-                                 [5, 4, 0, 5, 5],
-                                 [5, 4, 0, 4, 5]]
+        # Stored as an int8 array, indexed [r][c] like the board state
+        self.information_grid = np.array([[0, 0, 0, 0, 0],
+                                          [0, 0, 0, 0, 0],
+                                          [0, 0, 0, 0, 0],
+                                          [5, 4, 0, 5, 5],
+                                          [5, 4, 0, 4, 5]], dtype=np.int8)
+
+        # Board state as an int8 array, copied on every update
+        self.state_grid = None
+
+        # Layout arrays, built on the first update
+        self.segment_ids = None
+        self.neighbour_matrix = None
+
+        # Per-segment placement tables, built on the first update
+        self.placements = None
         
     def update(self):
         """
         Update the solver based on the current board state
         """
+        if self.segment_ids is None:
+            self.buildLayout()
+
         # Copy the board state
-        self.information_grid = copy.deepcopy(self.board.board_state)
+        self.state_grid = np.array(self.board.board_state, dtype=np.int8)
+        self.information_grid = self.state_grid.copy()
 
         # Update any missing Xs from star rules
         self.updateBlocked()
@@ -41,6 +84,9 @@ class Solver():
         # Update the locations where stars must be (1 star regions of size 1)
         self.update1StarMandatory()
 
+        # Update forced stars and Xs from the segment placement tables
+        self.updatePlacements()
+
         # Information grid:
         # 0 for empty or no info
         # 1 for star placed on board
@@ -48,143 +94,429 @@ class Solver():
         # 3 for star must be placed here
         # 4 for x must be placed here
 
+    def buildLayout(self):
+        """
+        Precompute the layout arrays: segment id per square and square adjacency
+        """
+        n = self.board.board_size
+        self.segment_ids = np.array(self.board.board_segments, dtype=np.intp)
+
+        # neighbour_matrix[i, j] is 1 if flat squares i and j are adjacent
+        eye = np.eye(n * n, dtype=bool).reshape(n * n, n, n)
+        neighbours = np.array([dilate(square) & ~square for square in eye]).reshape(n * n, n * n)
+        self.neighbour_matrix = neighbours.astype(np.float32)
+
     def updateBlocked(self):
         """
         Update all blocked locations from the current board
         """
         n = self.board.board_size
-        b = self.board.board_state
+        k = self.board.n_stars
+        stars = self.state_grid == 1
 
-        # For each square
-        for r in range(n):
-            for c in range(n):
-                # Only mark open squares
-                if b[r][c] != 0:
-                    continue
-                segment = self.board.board_segments[r][c]
-                # Square is blocked if row, col, segment is full
-                if self.board.row_stars[r] >= self.board.n_stars:
-                    self.information_grid[r][c] = 4
-                if self.board.col_stars[c] >= self.board.n_stars:
-                    self.information_grid[r][c] = 4
-                if self.board.seg_stars[segment] >= self.board.n_stars:
-                    self.information_grid[r][c] = 4
-                # Square is blocked if an adjacent star exists
-                for dr, dc in [(-1,-1), (-1,0), (-1,1), (0,-1), (0,1), (1,-1), (1,0), (1,1)]:
-                    rr, cc = r + dr, c + dc
-                    if (rr < 0) or (cc < 0) or (rr >= n) or (cc >= n):
-                        continue
-                    if b[rr][cc] == 1:
-                        self.information_grid[r][c] = 4
+        # Square is blocked if row, col, segment is full
+        row_full = stars.sum(axis=1) >= k
+        col_full = stars.sum(axis=0) >= k
+        seg_full = np.bincount(self.segment_ids[stars], minlength=n) >= k
+        full = row_full[:, None] | col_full[None, :] | seg_full[self.segment_ids]
+
+        # Square is blocked if an adjacent star exists
+        blocked = (self.state_grid == 0) & (full | dilate(stars))
+        self.information_grid[blocked] = 4
 
     def update1StarSegs(self):
         """
         Scan the board and build all segments that require 1 star
 
+        Stored as one boolean mask of open squares per segment in one_star_segs
         """
         n = self.board.board_size
-        b = self.board.board_state
+        k = self.board.n_stars
+        stars = self.state_grid == 1
+        open_squares = self.state_grid == 0
 
-        # Horizontal slices
-        horizontal_segs = []
-        for r in range(n):
-            if (self.board.n_stars - self.board.row_stars[r]) != 1:
-                continue
-            if self.board.row_stars[r] >= self.board.n_stars:
-                continue
-            h_seg = Segment()
-            for c in range(n):
-                if b[r][c] == 0:
-                    h_seg.squares.append((r, c))
-            horizontal_segs.append(h_seg)
-
-        # Vertical slices
-        vertical_segs = []
-        for c in range(n):
-            if (self.board.n_stars - self.board.col_stars[c]) != 1:
-                continue
-            if self.board.col_stars[c] >= self.board.n_stars:
-                continue
-            v_seg = Segment()
-            for r in range(n):
-                if b[r][c] == 0:
-                    v_seg.squares.append((r, c))
-            vertical_segs.append(v_seg)
-
-        # Sub segs:
-        sub_segs = []
-        for i, s in enumerate(self.board.segments):
-            if (self.board.n_stars - self.board.seg_stars[i]) != 1:
-                continue
-            if self.board.seg_stars[i] >= self.board.n_stars:
-                continue
-            s_seg = Segment()
-            for r, c in s.squares:
-                if b[r][c] == 0:
-                    s_seg.squares.append((r, c))
-            sub_segs.append(s_seg)
-
-        all_segs = horizontal_segs + vertical_segs + sub_segs
-        self.one_star_segs = all_segs
+        # Rows, cols and segments with exactly 1 star left
+        one_rows = (k - stars.sum(axis=1)) == 1
+        one_cols = (k - stars.sum(axis=0)) == 1
+        one_segs = (k - np.bincount(self.segment_ids[stars], minlength=n)) == 1
+
+        horizontal_segs = open_squares[None, :, :] & (np.arange(n)[:, None, None] == np.arange(n)[None, :, None])
+        vertical_segs = open_squares[None, :, :] & (np.arange(n)[:, None, None] == np.arange(n)[None, None, :])
+        sub_segs = open_squares[None, :, :] & (self.segment_ids[None, :, :] == np.arange(n)[:, None, None])
+
+        all_segs = np.concatenate([horizontal_segs[one_rows], vertical_segs[one_cols], sub_segs[one_segs]])
+        self.one_star_segs = all_segs.reshape(len(all_segs), n * n)
             
     def update1StarBlocked(self):
         """
         Update all board locations with (X required) that block a 1 star seg
         """
         n = self.board.board_size
+        segs = self.one_star_segs
+        if not len(segs):
+            return
 
-        blocking = [[False] * n for _ in range(n)]
+        sizes = segs.sum(axis=1)
+        blocking = np.zeros(n * n, dtype=bool)
+        # Counts are small integers, exact in float32 which uses BLAS
+        segs_f = segs.astype(np.float32)
 
         # Segment constraints
         # If segment s2 is a sub-seg of segment s1, block all squares in s1 that are not in s2
-        for s1 in self.one_star_segs:
-            s1_set = set(s1.squares)
-            for s2 in self.one_star_segs:
-                if len(s2.squares) >= len(s1.squares):
-                    continue
-                s2_set = set(s2.squares)
-                if not s2_set.issubset(s1_set):
-                    continue
-
-                # X all non-overlapping locations
-                for r, c in (s1_set - s2_set):
-                    blocking[r][c] = True
-                
+        overlap = segs_f @ segs_f.T
+        for i in range(len(segs)):
+            subsegs = (overlap[i] == sizes) & (sizes < sizes[i])
+            if subsegs.any():
+                blocking |= segs[i] & ~segs[subsegs].all(axis=0)
 
         # Adjacency constraints
         # If placing a star at a square would X a 1 star seg, block this square
-        for segment in self.one_star_segs:
-            if not segment.squares:
-                continue
-            # Map of items blocking this segment
-            seg_blocking = None
-            for r, c in segment.squares:
-                mask = [[False] * n for _ in range(n)]
-                for dr, dc in [(-1,-1), (-1,0), (-1,1), (0,-1), (0,1), (1,-1), (1,0), (1,1)]:
-                    rr, cc = r + dr, c + dc
-                    if (rr < 0) or (cc < 0) or (rr >= n) or (cc >= n):
-                        continue
-                    mask[rr][cc] = True
-
-                if seg_blocking is None:
-                    seg_blocking = mask
-                seg_blocking = np.bitwise_and(seg_blocking, mask)
-            blocking = np.bitwise_or(seg_blocking, blocking)
+        adjacent = segs_f @ self.neighbour_matrix
+        blocking |= ((adjacent == sizes[:, None]) & (sizes[:, None] > 0)).any(axis=0)
 
         # Set info array from blocking
-        for r in range(n):
-            for c in range(n):
-                if not blocking[r][c]:
-                    continue
-                if self.information_grid[r][c] == 0:
-                    self.information_grid[r][c] = 4
+        blocking = blocking.reshape(n, n) & (self.information_grid == 0)
+        self.information_grid[blocking] = 4
 
     def update1StarMandatory(self):
         """
         Update all squares where 1 star is necessarily located
         """
+        n = self.board.board_size
+        segs = self.one_star_segs
+        if not len(segs):
+            return
+
+        single = segs[segs.sum(axis=1) == 1].any(axis=0).reshape(n, n)
+        self.information_grid[single] = 3
+
+    def updatePlacements(self):
+        """
+        Update forced stars and Xs from the legal star placements of each segment
+        """
+        n = self.board.board_size
+        if self.placements is None:
+            self.placements = PlacementTable(self.board)
+
+        grid = self.information_grid.reshape(n * n)
+        stars = array_to_mask((grid == 1) | (grid == 3))
+        xs = array_to_mask((grid == 2) | (grid == 4))
+
+        # No placement fits, the board is already invalid
+        deduced = self.placements.deduce(stars, xs)
+        if deduced is None:
+            return
+        new_stars, new_xs = deduced
+
+        unknown = self.information_grid == 0
+        forced_stars = mask_to_array(new_stars, n * n).reshape(n, n) & unknown
+        forced_xs = mask_to_array(new_xs, n * n).reshape(n, n) & unknown & ~forced_stars
+        self.information_grid[forced_stars] = 3
+        self.information_grid[forced_xs] = 4
+
+
+class IncrementalSolver(Solver):
+    """
+    Solver that keeps every deduction together with the source that made it
+
+    A source is one rule applied to one place on the board (a star's
+    neighbours, a row/col/segment, a pair of overlapping units, the empty
+    1 star unit check, or a segment's placement table) and reads a fixed set of
+    squares. On update only the
+    sources reading a changed square are re-run, so the cost follows the size
+    of the change rather than the size of the board.
+    """
+    def __init__(self, board: Board) -> None:
+        super().__init__(board)
+        # Board state seen by the last update, None until the first update
+        self.last_state = None
+
+    def build(self):
+        """
+        Build the sources and the map from each square to the sources reading it
+        """
+        n = self.board.board_size
+        self.n = n
+
+        if self.placements is None:
+            self.placements = PlacementTable(self.board)
+
+        # Rows, cols and segments as lists of square indices
+        self.units = [[r * n + c for c in range(n)] for r in range(n)]
+        self.units += [[r * n + c for r in range(n)] for c in range(n)]
+        self.units += [[r * n + c for r, c in s.squares] for s in self.board.segments]
+
+        self.neighbours = neighbour_lists(n)
+
+        # Base sources read the board state, placement sources read the information grid
+        self.board_readers = [[] for _ in range(n * n)]
+        self.grid_readers = [[] for _ in range(n * n)]
+
+        for v in range(n * n):
+            self.board_readers[v].append(('adj', v))
+        for u, unit in enumerate(self.units):
+            for v in unit:
+                self.board_readers[v].append(('unit', u))
+
+        unit_sets = [set(unit) for unit in self.units]
+        for u1 in range(len(self.units)):
+            for u2 in range(u1 + 1, len(self.units)):
+                if unit_sets[u1] & unit_sets[u2]:
+                    for v in unit_sets[u1] | unit_sets[u2]:
+                        self.board_readers[v].append(('pair', u1, u2))
+
+        # A 1 star unit with no open squares is a subset of every other 1 star
+        # unit, overlapping or not, so one source reading the whole board covers it
+        for v in range(n * n):
+            self.board_readers[v].append(('empty',))
+
+        for s, segment in enumerate(self.board.segments):
+            read = set()
+            for r, c in segment.squares:
+                read.add(r * n + c)
+                read.update(self.neighbours[r * n + c])
+            for v in read:
+                self.grid_readers[v].append(('place', s))
+
+        # Deductions (square, code) made by each source, and per square counts
+        self.outputs = {}
+        self.star_support = [0] * (n * n)
+        self.x_support = [0] * (n * n)
+        # True while some segment has no placement left and placement deductions are dropped
+        self.contradiction = False
+
+        # Same int8 grid as Solver, starting from -1 (unset) so every square is filled in below
+        self.information_grid = np.full((n, n), -1, dtype=np.int8)
+        self.star_mask = 0
+        self.x_mask = 0
+        for v in range(n * n):
+            self.refresh(v)
+
+    def code(self, v: int) -> int:
+        """
+        Information grid code of square v from the board and its support counts
+        """
+        state = self.board.board_state[v // self.n][v % self.n]
+        if state != 0:
+            return state
+        if self.star_support[v]:
+            return 3
+        if self.x_support[v]:
+            return 4
+        return 0
+
+    def refresh(self, v: int) -> bool:
+        """
+        Recompute square v of the information grid, returns True if it changed
+        """
+        r, c = divmod(v, self.n)
+        new = self.code(v)
+        if new == self.information_grid[r, c]:
+            return False
+        self.information_grid[r, c] = new
+        bit = 1 << v
+        self.star_mask = (self.star_mask | bit) if new in (1, 3) else (self.star_mask & ~bit)
+        self.x_mask = (self.x_mask | bit) if new in (2, 4) else (self.x_mask & ~bit)
+        return True
+
+    def set_outputs(self, key, outputs):
+        """
+        Replace the deductions of a source
+
+        Returns (squares that lost support, squares whose grid code changed)
+        """
+        old = set(self.outputs.get(key, ()))
+        new = set(outputs)
+        self.outputs[key] = new
+
+        removed = []
+        touched = set()
+        for v, code in old - new:
+            if code == 3:
+                self.star_support[v] -= 1
+            else:
+                self.x_support[v] -= 1
+            removed.append(v)
+            touched.add(v)
+        for v, code in new - old:
+            if code == 3:
+                self.star_support[v] += 1
+            else:
+                self.x_support[v] += 1
+            touched.add(v)
+
+        changed = [v for v in touched if self.refresh(v)]
+        return removed, changed
+
+    def run_source(self, key):
+        """
+        Deductions of a source from the current board and information grid
+        """
+        kind = key[0]
+        if kind == 'adj':
+            return self.adjacent_rule(key[1])
+        if kind == 'unit':
+            return self.unit_rule(key[1])
+        if kind == 'pair':
+            return self.pair_rule(key[1], key[2])
+        if kind == 'empty':
+            return self.empty_rule()
+        return self.placement_rule(key[1])
+
+    def state(self, v: int) -> int:
+        return self.board.board_state[v // self.n][v % self.n]
+
+    def one_star_open(self, u: int):
+        """
+        Open squares of unit u if it needs exactly 1 more star, else None
+        """
+        stars = sum(1 for v in self.units[u] if self.state(v) == 1)
+        if self.board.n_stars - stars != 1:
+            return None
+        return [v for v in self.units[u] if self.state(v) == 0]
+
+    def adjacent_rule(self, v: int):
+        # A star blocks all adjacent squares
+        if self.state(v) != 1:
+            return []
+        return [(w, 4) for w in self.neighbours[v]]
+
+    def unit_rule(self, u: int):
+        unit = self.units[u]
+        stars = sum(1 for v in unit if self.state(v) == 1)
+        open_squares = [v for v in unit if self.state(v) == 0]
+
+        # Full units block their open squares
+        if stars >= self.board.n_stars:
+            return [(v, 4) for v in open_squares]
+        if self.board.n_stars - stars != 1 or not open_squares:
+            return []
+
+        # 1 star left: a single open square must be the star, which blocks its neighbours
+        if len(open_squares) == 1:
+            return [(open_squares[0], 3)] + [(w, 4) for w in self.neighbours[open_squares[0]]]
+
+        # 1 star left: squares adjacent to every open square are blocked
+        blocking = set(self.neighbours[open_squares[0]])
+        for v in open_squares[1:]:
+            blocking &= set(self.neighbours[v])
+        return [(v, 4) for v in blocking]
+
+    def pair_rule(self, u1: int, u2: int):
+        # If one 1 star unit is inside another, the rest of the larger one is blocked
+        o1 = self.one_star_open(u1)
+        o2 = self.one_star_open(u2)
+        if o1 is None or o2 is None:
+            return []
+        s1, s2 = set(o1), set(o2)
+        if len(s2) < len(s1) and s2 <= s1:
+            return [(v, 4) for v in s1 - s2]
+        if len(s1) < len(s2) and s1 <= s2:
+            return [(v, 4) for v in s2 - s1]
+        return []
+
+    def empty_rule(self):
+        # A 1 star unit with no open squares blocks the open squares of every other 1 star unit
+        open_units = [self.one_star_open(u) for u in range(len(self.units))]
+        if not any(o is not None and not o for o in open_units):
+            return []
+        blocked = set()
+        for o in open_units:
+            if o:
+                blocked.update(o)
+        return [(v, 4) for v in blocked]
+
+    def placement_rule(self, s: int):
+        table = self.placements.tables[s]
+        if table is None:
+            return []
+        forced = self.placements.forced(s, self.star_mask, self.x_mask)
+        if forced is None:
+            # Contradiction, propagate drops every placement deduction
+            return None
+        stars, xs = forced
+
+        outputs = []
+        for r, c in self.board.segments[s].squares:
+            v = r * self.n + c
+            if stars >> v & 1:
+                outputs.append((v, 3))
+            elif xs >> v & 1:
+                outputs.append((v, 4))
+        return outputs
+
+    def propagate(self, removed, changed):
+        """
+        Retract placement deductions that depended on squares which lost support,
+        then re-run placement sources until nothing changes
+
+        As in Solver, a segment with no surviving placement drops every
+        placement deduction, leaving only the base rules on the grid.
+        """
+        if self.contradiction:
+            # No placement deductions are held, so start them all afresh
+            self.contradiction = False
+            dirty = {('place', s) for s in range(len(self.board.segments))}
+        else:
+            dirty = set()
+
+            # Retract transitively, any removed support may have been holding up others
+            retract = list(removed)
+            while retract:
+                v = retract.pop()
+                for key in self.grid_readers[v]:
+                    if key in dirty:
+                        continue
+                    dirty.add(key)
+                    lost, _ = self.set_outputs(key, [])
+                    retract.extend(lost)
+
+            for v in changed:
+                dirty.update(self.grid_readers[v])
+
+        # Re-derive, new deductions only ever add facts from here on
+        while dirty:
+            key = dirty.pop()
+            outputs = self.run_source(key)
+            if outputs is None:
+                self.contradiction = True
+                for s in range(len(self.board.segments)):
+                    self.set_outputs(('place', s), [])
+                return
+            _, new_changed = self.set_outputs(key, outputs)
+            for v in new_changed:
+                dirty.update(self.grid_readers[v])
+
+    def update(self):
+        """
+        Update the deductions for the squares changed since the last update
+        """
+        n = self.board.board_size
+        b = self.board.board_state
+
+        if self.last_state is None:
+            self.build()
+            keys = [('adj', v) for v in range(n * n)]
+            keys += [('unit', u) for u in range(len(self.units))]
+            keys += list({key for readers in self.board_readers for key in readers if key[0] == 'pair'})
+            keys.append(('empty',))
+            squares = range(n * n)
+        else:
+            squares = [r * n + c for r in range(n) for c in range(n) if b[r][c] != self.last_state[r][c]]
+            keys = list({key for v in squares for key in self.board_readers[v]})
+
+        removed, changed = [], []
+        # The changed squares themselves are new facts and may have removed old ones
+        for v in squares:
+            if self.refresh(v) or self.last_state is not None:
+                removed.append(v)
+                changed.append(v)
+        for key in keys:
+            lost, new_changed = self.set_outputs(key, self.run_source(key))
+            removed += lost
+            changed += new_changed
 
-        for s in self.one_star_segs:
-            if len(s.squares) == 1:
-                r, c = s.squares[0]
-                self.information_grid[r][c] = 3
\ No newline at end of file
+        if self.last_state is None:
+            changed = range(n * n)
+        self.propagate(removed, changed)
+        self.last_state = [list(row) for row in b]